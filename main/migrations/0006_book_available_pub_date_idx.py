@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_alter_bookrating_rating'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('available', True)), fields=['publication_date'], name='book_available_pub_date_idx'),
+        ),
+    ]
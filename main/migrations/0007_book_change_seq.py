@@ -0,0 +1,45 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:31
+
+from django.db import migrations, models
+
+
+def number_existing_books(apps, schema_editor):
+    Book = apps.get_model('main', 'Book')
+    CatalogSequence = apps.get_model('main', 'CatalogSequence')
+    seq = 0
+    for book in Book.objects.order_by('pk'):
+        seq += 1
+        book.change_seq = seq
+        book.save(update_fields=['change_seq'])
+    CatalogSequence.objects.create(pk=1, value=seq)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_book_available_pub_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book_id', models.BigIntegerField()),
+                ('change_seq', models.BigIntegerField(db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CatalogSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(number_existing_books, migrations.RunPython.noop),
+    ]
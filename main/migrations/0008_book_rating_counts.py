@@ -0,0 +1,52 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:32
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_existing_ratings(apps, schema_editor):
+    Book = apps.get_model('main', 'Book')
+    BookRating = apps.get_model('main', 'BookRating')
+    counts = BookRating.objects.filter(rating__range=(1, 5)).values(
+        'book_id', 'rating'
+    ).annotate(total=Count('id'))
+    for row in counts:
+        Book.objects.filter(pk=row['book_id']).update(
+            **{f"rating_{row['rating']}_count": row['total']}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_book_change_seq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='rating_1_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_2_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_3_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_4_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_5_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_existing_ratings, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,38 @@
-from django.db import models
-from django.db.models import Avg
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 
 def validate_author(value):
     pass
 
 
+class CatalogSequence(models.Model):
+    """
+    Single row counter handing out monotonic change sequence numbers.
+    The UPDATE holds the row (or SQLite database) write lock until the
+    surrounding transaction commits, so numbers become visible in order.
+    """
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.value)
+
+
+def next_change_seq(count=1):
+    """
+    Reserve ``count`` change sequence numbers and return the last one.
+    Must be called inside a transaction.
+    """
+    updated = CatalogSequence.objects.filter(pk=1).update(
+        value=F('value') + count
+    )
+    if not updated:
+        CatalogSequence.objects.create(pk=1, value=count)
+    return CatalogSequence.objects.get(pk=1).value
+
+
 class BookRating(models.Model):
     book = models.ForeignKey('Book', on_delete=models.CASCADE)
     rating = models.IntegerField(default=0)
@@ -13,11 +41,29 @@ class BookRating(models.Model):
         return f"{self.book} - {self.rating}"
     
     def save(self, **kwargs):
-        instance = super().save(**kwargs)
-        rating = BookRating.objects.filter(book=instance.book).aggregate(Avg('rating'))
-        instance.book.rating = rating['rating__avg']
-        instance.book.save()
-        return instance
+        if self.rating not in Book.RATING_COUNT_FIELDS:
+            raise ValidationError("Rating must be between 1 and 5.")
+
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = BookRating.objects.filter(pk=self.pk).values_list(
+                    'book_id', 'rating'
+                ).first()
+            super().save(**kwargs)
+            if previous is None:
+                self.book.update_rating_stats(added=self.rating)
+                return
+            previous_book_id, previous_rating = previous
+            if previous_book_id == self.book_id:
+                self.book.update_rating_stats(
+                    added=self.rating, removed=previous_rating
+                )
+                return
+            previous_book = Book.objects.filter(pk=previous_book_id).first()
+            if previous_book is not None:
+                previous_book.update_rating_stats(removed=previous_rating)
+            self.book.update_rating_stats(added=self.rating)
 
 
 class Book(models.Model):
@@ -26,6 +72,105 @@ class Book(models.Model):
     publication_date = models.DateField()
     available = models.BooleanField(default=True)
     rating = models.FloatField(default=0.0)
+    change_seq = models.BigIntegerField(default=0, db_index=True)
+    rating_1_count = models.IntegerField(default=0)
+    rating_2_count = models.IntegerField(default=0)
+    rating_3_count = models.IntegerField(default=0)
+    rating_4_count = models.IntegerField(default=0)
+    rating_5_count = models.IntegerField(default=0)
+
+    RATING_COUNT_FIELDS = {
+        1: 'rating_1_count',
+        2: 'rating_2_count',
+        3: 'rating_3_count',
+        4: 'rating_4_count',
+        5: 'rating_5_count',
+    }
+
+    class Meta:
+        indexes = [
+            # Year lookups compile to a BETWEEN on publication_date, so
+            # this lets available-by-year queries seek instead of scan.
+            models.Index(
+                fields=['publication_date'],
+                condition=Q(available=True),
+                name='book_available_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.title
+
+    def save(self, **kwargs):
+        with transaction.atomic():
+            self.change_seq = next_change_seq()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'change_seq'}
+            super().save(**kwargs)
+
+    @property
+    def rating_distribution(self):
+        return {
+            stars: getattr(self, field)
+            for stars, field in self.RATING_COUNT_FIELDS.items()
+        }
+
+    def update_rating_stats(self, added=None, removed=None):
+        """
+        Adjust the stored star counts for one added and/or removed rating
+        and recompute the average from them. Ratings outside 1-5 (only
+        possible in rows saved before validation existed) are ignored.
+        """
+        deltas = {}
+        for stars, delta in ((added, 1), (removed, -1)):
+            field = self.RATING_COUNT_FIELDS.get(stars)
+            if field:
+                deltas[field] = deltas.get(field, 0) + delta
+
+        with transaction.atomic():
+            if deltas:
+                Book.objects.filter(pk=self.pk).update(**{
+                    field: F(field) + delta for field, delta in deltas.items()
+                })
+            self.refresh_from_db(fields=self.RATING_COUNT_FIELDS.values())
+            distribution = self.rating_distribution
+            total = sum(distribution.values())
+            self.rating = 0.0
+            if total:
+                self.rating = sum(
+                    stars * count for stars, count in distribution.items()
+                ) / total
+            self.save(
+                update_fields=['rating', *self.RATING_COUNT_FIELDS.values()]
+            )
+
+
+class BookTombstone(models.Model):
+    """
+    Record of a deleted book, so the change feed can tell replicas
+    to drop it.
+    """
+    book_id = models.BigIntegerField()
+    change_seq = models.BigIntegerField(db_index=True)
+
+    def __str__(self):
+        return f"{self.book_id} (deleted)"
+
+
+@receiver(post_delete, sender=Book)
+def create_book_tombstone(sender, instance, **kwargs):
+    with transaction.atomic():
+        BookTombstone.objects.create(
+            book_id=instance.pk, change_seq=next_change_seq()
+        )
+
+
+@receiver(post_delete, sender=BookRating)
+def remove_book_rating(sender, instance, origin=None, **kwargs):
+    # Ratings cascade-deleted along with their book need no bookkeeping.
+    if isinstance(origin, Book) or getattr(origin, 'model', None) is Book:
+        return
+    book = Book.objects.filter(pk=instance.book_id).first()
+    if book is not None:
+        book.update_rating_stats(removed=instance.rating)
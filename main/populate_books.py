@@ -1,5 +1,8 @@
 from datetime import date
-from .models import Book
+
+from django.db import transaction
+
+from .models import Book, next_change_seq
 
 
 def populate_books():
@@ -76,5 +79,13 @@ def populate_books():
         },
     ]
 
-    books = [Book(**book) for book in sample_books]
-    Book.objects.bulk_create(books)
+    # bulk_create skips Book.save(), so reserve the change sequence
+    # numbers up front.
+    with transaction.atomic():
+        last_seq = next_change_seq(len(sample_books))
+        first_seq = last_seq - len(sample_books) + 1
+        books = [
+            Book(**book, change_seq=seq)
+            for seq, book in enumerate(sample_books, start=first_seq)
+        ]
+        Book.objects.bulk_create(books)
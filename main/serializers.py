@@ -1,28 +1,55 @@
 from datetime import datetime
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from .models import Book
+from django.db import transaction
+from django.db.models import F
+from .models import Book, next_change_seq
 
 
 class BookSerializer:
-    def __init__(self, instance=None, data=None, many=False):
+    FIELDS = ("title", "author", "publication_date", "available", "rating")
+    # Only serialized when asked for explicitly through ``fields``.
+    OPTIONAL_FIELDS = ("rating_distribution",)
+    # Model columns backing fields that are not columns themselves.
+    SOURCE_FIELDS = {
+        "rating_distribution": tuple(Book.RATING_COUNT_FIELDS.values()),
+    }
+
+    def __init__(self, instance=None, data=None, many=False, fields=None):
         """
         Initialize the serializer with a model instance or input data.
         :param instance: A Book instance or queryset (optional).
         :param data: Input data for validation and deserialization (optional).
         :param many: If True, handle multiple objects (e.g., querysets).
+        :param fields: Names of the fields to include in the output
+            (optional, defaults to all of FIELDS).
         """
         self.instance = instance
         self.data = data
         self.many = many
+        self.fields = fields or self.FIELDS
         self.errors = []
         self.validated_data = None
 
+    @classmethod
+    def source_fields(cls, fields):
+        """
+        Map serializer field names to the model columns they read, for use
+        with QuerySet.only().
+        """
+        columns = []
+        for field in fields:
+            columns.extend(cls.SOURCE_FIELDS.get(field, (field,)))
+        return columns
+
     def to_representation(self):
         """
         Convert a model instance (or queryset) to a dictionary 
         (or list of dictionaries).
         """
-        if self.many and self.instance:
+        if self.many:
+            if self.instance is None:
+                return []
             return [
                 self._to_representation_object(obj) for obj in self.instance
             ]
@@ -32,15 +59,16 @@ class BookSerializer:
 
     def _to_representation_object(self, obj):
         """
-        Helper method to serialize a single object.
+        Helper method to serialize a single object. Only the requested
+        fields are read, so deferred columns are never loaded.
         """
-        return {
-            "title": obj.title,
-            "author": obj.author,
-            "publication_date": obj.publication_date.isoformat(),
-            "available": obj.available,
-            "rating": obj.rating,
-        }
+        data = {}
+        for field in self.fields:
+            value = getattr(obj, field)
+            if field == "publication_date":
+                value = value.isoformat()
+            data[field] = value
+        return data
 
     def is_valid(self):
         """
@@ -105,3 +133,135 @@ class BookSerializer:
                 return self.instance
             else:
                 return Book.objects.create(**self.validated_data)
+
+
+class BookAvailabilitySerializer:
+    def __init__(self, data=None):
+        """
+        Initialize the serializer with a list of availability changes, each
+        a dictionary with an ``id`` or ``title`` and an ``available`` flag.
+        """
+        self.data = data
+        self.errors = []
+        self.validated_data = None
+
+    def is_valid(self):
+        """
+        Validate the input data.
+        :return: True if data is valid, False otherwise.
+        """
+        if not isinstance(self.data, list):
+            self.errors = {"error": "Expected a list."}
+            return False
+
+        max_items = settings.BULK_UPDATE_MAX_ITEMS
+        if len(self.data) > max_items:
+            self.errors = {"error": f"Expected at most {max_items} items."}
+            return False
+
+        self.errors = [self._validate_single(d) for d in self.data]
+        if all(e is None for e in self.errors):
+            self.validated_data = self.data
+            return True
+        return False
+
+    def _validate_single(self, data):
+        """
+        Validate a single availability change.
+        """
+        if not isinstance(data, dict):
+            return {"error": "Expected a dictionary."}
+
+        errors = {}
+
+        if ("id" in data) == ("title" in data):
+            errors["id"] = "Exactly one of 'id' or 'title' is required."
+        elif "id" in data and (
+            not isinstance(data["id"], int) or isinstance(data["id"], bool)
+        ):
+            errors["id"] = "Must be an integer."
+        elif "title" in data and not isinstance(data["title"], str):
+            errors["title"] = "Must be a string."
+
+        if "available" not in data:
+            errors["available"] = "This field is required."
+        elif not isinstance(data["available"], bool):
+            errors["available"] = "Must be a boolean."
+
+        return errors if errors else None
+
+    def save(self):
+        """
+        Apply the validated changes with chunked UPDATEs in one transaction.
+        Books are matched by primary key or by exact title; when several
+        entries name the same book, the last one in the request wins.
+        The whole request holds the CatalogSequence row lock, blocking
+        other Book writes until it commits, so payloads are capped at
+        BULK_UPDATE_MAX_ITEMS.
+        :return: Counts of books changed, books already in the requested
+            state, and entries that matched no book.
+        """
+        if self.validated_data is None:
+            raise ValidationError("Cannot save without validated data.")
+
+        chunk_size = settings.BULK_UPDATE_CHUNK_SIZE
+        counts = {"changed": 0, "unchanged": 0, "not_found": 0}
+
+        with transaction.atomic():
+            current = {}
+            pks_by_title = {}
+            for lookup in ("pk", "title"):
+                key = "id" if lookup == "pk" else "title"
+                keys = list({d[key] for d in self.validated_data if key in d})
+                for start in range(0, len(keys), chunk_size):
+                    rows = Book.objects.filter(
+                        **{f"{lookup}__in": keys[start:start + chunk_size]}
+                    ).values_list("pk", "title", "available")
+                    for pk, title, available in rows:
+                        current[pk] = available
+                        if lookup == "title":
+                            pks_by_title.setdefault(title, []).append(pk)
+
+            wanted = {}
+            for data in self.validated_data:
+                if "id" in data:
+                    pks = [data["id"]] if data["id"] in current else []
+                else:
+                    pks = pks_by_title.get(data["title"], [])
+                if not pks:
+                    counts["not_found"] += 1
+                for pk in pks:
+                    wanted[pk] = data["available"]
+
+            to_change = {True: [], False: []}
+            for pk, available in wanted.items():
+                if current[pk] == available:
+                    counts["unchanged"] += 1
+                else:
+                    to_change[available].append(pk)
+
+            for available, pks in to_change.items():
+                # Sorted chunks keep each chunk's pk span, and so the block
+                # of sequence numbers _update() reserves, small.
+                pks.sort()
+                for start in range(0, len(pks), chunk_size):
+                    counts["changed"] += self._update(
+                        pks[start:start + chunk_size], available
+                    )
+
+        return counts
+
+    def _update(self, pks, available):
+        """
+        Set ``available`` on the given books, giving each its own change
+        sequence number so the delta sync feed picks them up. Numbers are
+        derived from the pk, so the reserved block may contain gaps.
+        :param pks: Sorted primary keys.
+        """
+        if not pks:
+            return 0
+        last_seq = next_change_seq(pks[-1] - pks[0] + 1)
+        return Book.objects.filter(pk__in=pks).update(
+            available=available,
+            change_seq=F('pk') + (last_seq - pks[-1]),
+        )
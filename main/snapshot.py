@@ -0,0 +1,103 @@
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Book, CatalogSequence
+from .serializers import BookSerializer
+
+
+class CatalogSnapshot:
+    """
+    Immutable, pre-serialized copy of the available books, kept sorted
+    so list, author and year pages are served by slicing.
+    """
+
+    def __init__(self, version, books):
+        """
+        :param version: The catalog version the books were read at.
+        :param books: Available Book instances, in any order.
+        """
+        self.version = version
+        fields = BookSerializer.FIELDS + BookSerializer.OPTIONAL_FIELDS
+        rows = [
+            (book, BookSerializer(book, fields=fields).to_representation())
+            for book in books
+        ]
+
+        self.by_rating = [
+            row for book, row in sorted(
+                rows, key=lambda r: (-r[0].rating, r[0].pk)
+            )
+        ]
+
+        self._by_author = {}
+        for book, row in sorted(rows, key=lambda r: r[0].pk):
+            self._by_author.setdefault(book.author.lower(), []).append(row)
+
+        by_date = sorted(rows, key=lambda r: (r[0].publication_date, r[0].pk))
+        self._dates = [book.publication_date for book, row in by_date]
+        self._by_date = [row for book, row in by_date]
+
+    @classmethod
+    def build(cls):
+        with transaction.atomic():
+            version = current_catalog_version()
+            books = list(Book.objects.filter(available=True))
+        return cls(version, books)
+
+    def by_author(self, author):
+        return self._by_author.get(author.lower(), [])
+
+    def by_years(self, year_from, year_to):
+        start = bisect_left(self._dates, date(year_from, 1, 1))
+        end = bisect_right(self._dates, date(year_to, 12, 31))
+        return self._by_date[start:end]
+
+
+def current_catalog_version():
+    version = CatalogSequence.objects.filter(pk=1).values_list(
+        'value', flat=True
+    ).first()
+    return version or 0
+
+
+def select_fields(rows, fields=None):
+    """
+    Narrow pre-serialized snapshot rows to the requested fields.
+    """
+    fields = fields or BookSerializer.FIELDS
+    return [{field: row[field] for field in fields} for row in rows]
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_catalog_snapshot():
+    """
+    Return this process's catalog snapshot, rebuilding it first if the
+    catalog version has moved on. Returns None unless
+    CATALOG_SNAPSHOT_ENABLED is set.
+    """
+    global _snapshot
+
+    if not settings.CATALOG_SNAPSHOT_ENABLED:
+        return None
+
+    version = current_catalog_version()
+    snapshot = _snapshot
+    if snapshot is None or snapshot.version != version:
+        with _snapshot_lock:
+            snapshot = _snapshot
+            if snapshot is None or snapshot.version != version:
+                snapshot = CatalogSnapshot.build()
+                _snapshot = snapshot
+    return snapshot
+
+
+def clear_catalog_snapshot():
+    global _snapshot
+    _snapshot = None
@@ -1,9 +1,14 @@
-from django.test import TestCase
+import json
+from django.test import TestCase, override_settings
 from datetime import date
 
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from .models import Book
-from .serializers import BookSerializer
+from .models import Book, BookRating
+from .serializers import BookAvailabilitySerializer, BookSerializer
+from .snapshot import clear_catalog_snapshot
 
 
 class BookSerializerTest(TestCase):
@@ -58,6 +63,15 @@ class BookSerializerTest(TestCase):
         ]
         self.assertEqual(data, expected_data)
 
+    def test_to_representation_with_fields(self):
+        serializer = BookSerializer(
+            instance=self.book, fields=["title", "rating"]
+        )
+        self.assertEqual(
+            serializer.to_representation(),
+            {"title": "Test Book", "rating": 4.0}
+        )
+
     def test_is_valid_valid_data(self):
         valid_data = {
             "title": "Valid Book",
@@ -215,3 +229,583 @@ class BookViewsTest(TestCase):
         response = self.client.post(reverse('list-books'))
         self.assertEqual(response.status_code, 405)
         self.assertEqual(response.json()['error'], "GET request required")
+
+    def test_get_books_by_publication_year(self):
+        response = self.client.get(reverse('books-by-year', args=[2021]))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            [book['title'] for book in data['data']],
+            ["Book One", "Another Book"]
+        )
+
+    def test_get_books_by_publication_year_range(self):
+        Book.objects.create(
+            title="Book Three",
+            author="Author C",
+            publication_date=date(2023, 3, 3),
+            available=True,
+            rating=2.0
+        )
+        response = self.client.get(
+            reverse('books-by-year-range', args=[2021, 2022])
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['total_items'], 2)
+        self.assertEqual(
+            [book['title'] for book in data['data']],
+            ["Book One", "Another Book"]
+        )
+
+    def test_get_books_by_publication_year_range_inverted(self):
+        response = self.client.get(
+            reverse('books-by-year-range', args=[2022, 2021])
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()['error'],
+            "year_from must not be greater than year_to"
+        )
+
+    def test_get_books_list_with_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('list-books') + '?fields=title,rating'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()['data'],
+            [
+                {"title": "Book One", "rating": 4.5},
+                {"title": "Another Book", "rating": 3.5},
+            ]
+        )
+        select = queries.captured_queries[-1]['sql']
+        self.assertNotIn('"author"', select)
+        self.assertNotIn('"publication_date"', select)
+
+    def test_get_books_list_invalid_fields(self):
+        response = self.client.get(reverse('list-books') + '?fields=title,isbn')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()['error'], "Invalid fields parameter: isbn"
+        )
+
+    def test_get_book_with_fields(self):
+        response = self.client.get(
+            reverse('get-book', args=["Book One"]) + '?fields=author'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"author": "Author A"})
+
+    def test_get_books_list_gzip(self):
+        response = self.client.get(
+            reverse('list-books'), HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+
+class BookChangesTest(TestCase):
+    def setUp(self):
+        self.book1 = Book.objects.create(
+            title="Book One",
+            author="Author A",
+            publication_date=date(2021, 1, 1),
+            available=True,
+        )
+        self.book2 = Book.objects.create(
+            title="Book Two",
+            author="Author B",
+            publication_date=date(2022, 6, 15),
+            available=False,
+        )
+
+    def get_changes(self, **params):
+        response = self.client.get(reverse('books-changes'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_full_sync(self):
+        data = self.get_changes()
+        self.assertEqual(
+            [book['id'] for book in data['changed']],
+            [self.book1.pk, self.book2.pk]
+        )
+        self.assertEqual(data['deleted'], [])
+        self.assertFalse(data['has_more'])
+
+    def test_only_changes_since_token(self):
+        token = self.get_changes()['next_token']
+        self.book1.available = False
+        self.book1.save()
+
+        data = self.get_changes(since=token)
+        self.assertEqual([book['id'] for book in data['changed']],
+                         [self.book1.pk])
+        self.assertFalse(data['changed'][0]['available'])
+
+        data = self.get_changes(since=data['next_token'])
+        self.assertEqual(data['changed'], [])
+        self.assertEqual(data['next_token'], str(self.book1.change_seq))
+
+    def test_rating_bumps_change_seq(self):
+        token = self.get_changes()['next_token']
+        BookRating.objects.create(book=self.book2, rating=4)
+
+        data = self.get_changes(since=token)
+        self.assertEqual([book['id'] for book in data['changed']],
+                         [self.book2.pk])
+        self.assertEqual(data['changed'][0]['rating'], 4.0)
+
+    def test_deleted_books_are_tombstoned(self):
+        token = self.get_changes()['next_token']
+        book_id = self.book1.pk
+        Book.objects.filter(pk=book_id).delete()
+
+        data = self.get_changes(since=token)
+        self.assertEqual(data['changed'], [])
+        self.assertEqual(data['deleted'], [book_id])
+
+    def test_batches(self):
+        self.book1.delete()
+        Book.objects.create(
+            title="Book Three",
+            author="Author C",
+            publication_date=date(2023, 3, 3),
+            available=True,
+        )
+
+        data = self.get_changes(limit=2)
+        self.assertTrue(data['has_more'])
+        self.assertEqual(len(data['changed']) + len(data['deleted']), 2)
+
+        data = self.get_changes(since=data['next_token'], limit=2)
+        self.assertFalse(data['has_more'])
+        self.assertEqual([book['title'] for book in data['changed']],
+                         ["Book Three"])
+
+    def test_invalid_since(self):
+        response = self.client.get(reverse('books-changes') + '?since=abc')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], "Invalid since parameter")
+
+
+class BookRatingDistributionTest(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(
+            title="Rated Book",
+            author="Author A",
+            publication_date=date(2021, 1, 1),
+            available=True,
+        )
+        for rating in (5, 5, 4, 1):
+            BookRating.objects.create(book=self.book, rating=rating)
+
+    def test_counts_updated_on_insert(self):
+        self.book.refresh_from_db()
+        self.assertEqual(
+            self.book.rating_distribution, {1: 1, 2: 0, 3: 0, 4: 1, 5: 2}
+        )
+        self.assertEqual(self.book.rating, 3.75)
+
+    def test_counts_updated_on_change(self):
+        book_rating = BookRating.objects.filter(rating=1).get()
+        book_rating.rating = 3
+        book_rating.save()
+        self.book.refresh_from_db()
+        self.assertEqual(
+            self.book.rating_distribution, {1: 0, 2: 0, 3: 1, 4: 1, 5: 2}
+        )
+
+    def test_out_of_range_rating_rejected(self):
+        for rating in (0, 6):
+            with self.assertRaises(ValidationError):
+                BookRating.objects.create(book=self.book, rating=rating)
+        self.book.refresh_from_db()
+        self.assertEqual(
+            self.book.rating_distribution, {1: 1, 2: 0, 3: 0, 4: 1, 5: 2}
+        )
+        self.assertEqual(self.book.rating, 3.75)
+
+    def test_average_ignores_legacy_out_of_range_ratings(self):
+        BookRating.objects.bulk_create([BookRating(book=self.book, rating=0)])
+        BookRating.objects.create(book=self.book, rating=3)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.rating, 3.6)
+
+        BookRating.objects.filter(rating=0).delete()
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.rating, 3.6)
+
+    def test_rating_update_does_not_aggregate_ratings(self):
+        with CaptureQueriesContext(connection) as queries:
+            BookRating.objects.create(book=self.book, rating=2)
+        self.assertFalse(any(
+            'AVG(' in query['sql'] for query in queries.captured_queries
+        ))
+
+    def test_counts_updated_on_move_to_other_book(self):
+        other = Book.objects.create(
+            title="Other Book",
+            author="Author B",
+            publication_date=date(2022, 1, 1),
+            available=True,
+        )
+        book_rating = BookRating.objects.filter(rating=1).get()
+        book_rating.book = other
+        book_rating.save()
+
+        self.book.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(
+            self.book.rating_distribution, {1: 0, 2: 0, 3: 0, 4: 1, 5: 2}
+        )
+        self.assertAlmostEqual(self.book.rating, 14 / 3)
+        self.assertEqual(
+            other.rating_distribution, {1: 1, 2: 0, 3: 0, 4: 0, 5: 0}
+        )
+        self.assertEqual(other.rating, 1.0)
+
+    def test_rating_does_not_overwrite_stale_fields(self):
+        stale = Book.objects.get(pk=self.book.pk)
+        Book.objects.filter(pk=self.book.pk).update(available=False)
+        BookRating.objects.create(book=stale, rating=3)
+
+        self.book.refresh_from_db()
+        self.assertFalse(self.book.available)
+        self.assertEqual(self.book.rating_distribution[3], 1)
+
+    def test_counts_updated_on_delete(self):
+        BookRating.objects.filter(rating=5).delete()
+        self.book.refresh_from_db()
+        self.assertEqual(
+            self.book.rating_distribution, {1: 1, 2: 0, 3: 0, 4: 1, 5: 0}
+        )
+        self.assertEqual(self.book.rating, 2.5)
+
+    def test_book_delete_cascades_ratings(self):
+        self.book.delete()
+        self.assertFalse(BookRating.objects.exists())
+
+    def test_serializer_rating_distribution(self):
+        self.book.refresh_from_db()
+        serializer = BookSerializer(
+            instance=self.book, fields=["title", "rating_distribution"]
+        )
+        self.assertEqual(serializer.to_representation(), {
+            "title": "Rated Book",
+            "rating_distribution": {1: 1, 2: 0, 3: 0, 4: 1, 5: 2},
+        })
+
+    def test_list_with_distribution_costs_no_extra_queries(self):
+        url = reverse('list-books')
+        with CaptureQueriesContext(connection) as plain:
+            self.client.get(url)
+        with self.assertNumQueries(len(plain)):
+            response = self.client.get(url + '?fields=title,rating_distribution')
+        self.assertEqual(
+            response.json()['data'][0]['rating_distribution'],
+            {"1": 1, "2": 0, "3": 0, "4": 1, "5": 2}
+        )
+
+    def test_get_book_rating_distribution(self):
+        response = self.client.get(
+            reverse('book-rating-distribution', args=["Rated Book"])
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['total_ratings'], 4)
+        self.assertEqual(
+            data['rating_distribution'],
+            {"1": 1, "2": 0, "3": 0, "4": 1, "5": 2}
+        )
+
+
+@override_settings(CATALOG_SNAPSHOT_ENABLED=True)
+class CatalogSnapshotTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for title, author, year, available, rating in [
+            ("Book One", "Author A", 2021, True, 4.5),
+            ("Book Two", "Author B", 2022, False, 5),
+            ("Another Book", "author a", 2021, True, 3.5),
+            ("Book Three", "Author C", 2023, True, 4.9),
+        ]:
+            Book.objects.create(
+                title=title,
+                author=author,
+                publication_date=date(year, 3, 1),
+                available=available,
+                rating=rating
+            )
+
+    def setUp(self):
+        clear_catalog_snapshot()
+        self.addCleanup(clear_catalog_snapshot)
+
+    def assertMatchesDatabase(self, url, status_code=200):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status_code)
+        with self.settings(CATALOG_SNAPSHOT_ENABLED=False):
+            expected = self.client.get(url)
+        self.assertEqual(expected.status_code, status_code)
+        self.assertEqual(response.json(), expected.json())
+
+    def test_list_matches_database(self):
+        self.assertMatchesDatabase(reverse('list-books'))
+        self.assertMatchesDatabase(
+            reverse('list-books') + '?page=2&page_size=2&fields=title'
+        )
+
+    def test_author_matches_database(self):
+        self.assertMatchesDatabase(
+            reverse('books-by-author', args=["AUTHOR A"])
+        )
+        self.assertMatchesDatabase(
+            reverse('books-by-author', args=["Nobody"])
+        )
+
+    def test_years_match_database(self):
+        self.assertMatchesDatabase(reverse('books-by-year', args=[2021]))
+        self.assertMatchesDatabase(
+            reverse('books-by-year-range', args=[2021, 2023])
+        )
+
+    def test_out_of_range_year(self):
+        for url in [
+            reverse('books-by-year', args=[0]),
+            reverse('books-by-year-range', args=[2021, 10000]),
+        ]:
+            self.assertMatchesDatabase(url, status_code=400)
+            self.assertEqual(
+                self.client.get(url).json()['error'],
+                "Year must be between 1 and 9999"
+            )
+
+    def test_cached_snapshot_only_checks_version(self):
+        self.client.get(reverse('list-books'))
+        with self.assertNumQueries(1):
+            self.client.get(reverse('list-books'))
+
+    def test_refreshes_when_catalog_changes(self):
+        self.client.get(reverse('list-books'))
+        book = Book.objects.get(title="Book Two")
+        book.available = True
+        book.save()
+
+        response = self.client.get(reverse('list-books'))
+        self.assertEqual(
+            response.json()['data'][0]['title'], "Book Two"
+        )
+
+
+@override_settings(BULK_UPDATE_CHUNK_SIZE=2)
+class BookAvailabilityTest(TestCase):
+    def setUp(self):
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}",
+                author="Author A",
+                publication_date=date(2021, 1, 1),
+                available=True,
+            )
+            for i in range(5)
+        ]
+
+    def post(self, data):
+        return self.client.post(
+            reverse('books-availability'),
+            json.dumps(data),
+            content_type='application/json'
+        )
+
+    def test_updates_by_id_and_title(self):
+        token = self.client.get(reverse('books-changes')).json()['next_token']
+        response = self.post([
+            {"id": self.books[0].pk, "available": False},
+            {"id": self.books[1].pk, "available": False},
+            {"id": self.books[2].pk, "available": True},
+            {"title": "Book 3", "available": False},
+            {"id": 0, "available": False},
+            {"title": "Missing", "available": True},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(), {"changed": 3, "unchanged": 1, "not_found": 2}
+        )
+        self.assertEqual(
+            list(Book.objects.filter(available=True).values_list(
+                'title', flat=True
+            ).order_by('title')),
+            ["Book 2", "Book 4"]
+        )
+
+        changes = self.client.get(
+            reverse('books-changes'), {"since": token}
+        ).json()
+        self.assertEqual(
+            [book['title'] for book in changes['changed']],
+            ["Book 0", "Book 1", "Book 3"]
+        )
+
+    def test_same_book_by_id_and_title_counted_once(self):
+        response = self.post([
+            {"id": self.books[0].pk, "available": False},
+            {"title": "Book 0", "available": True},
+            {"title": "Book 1", "available": False},
+            {"id": self.books[1].pk, "available": True},
+            {"id": self.books[2].pk, "available": True},
+            {"id": self.books[2].pk, "available": False},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(), {"changed": 1, "unchanged": 2, "not_found": 0}
+        )
+        self.assertEqual(
+            list(Book.objects.filter(available=False).values_list(
+                'title', flat=True
+            )),
+            ["Book 2"]
+        )
+
+    def test_sequence_numbers_across_chunks(self):
+        last_seq = Book.objects.order_by('-change_seq')[0].change_seq
+        response = self.post([
+            {"id": book.pk, "available": False} for book in self.books
+        ])
+        self.assertEqual(response.json()['changed'], 5)
+        self.assertEqual(
+            list(Book.objects.order_by('pk').values_list(
+                'change_seq', flat=True
+            )),
+            list(range(last_seq + 1, last_seq + 6))
+        )
+
+    def test_sequence_numbers_with_sparse_pks(self):
+        self.books[1].delete()
+        self.books[3].delete()
+        token = self.client.get(reverse('books-changes')).json()['next_token']
+        remaining = [self.books[4], self.books[0], self.books[2]]
+        self.post([
+            {"id": book.pk, "available": False} for book in remaining
+        ])
+
+        seqs = list(Book.objects.order_by('pk').values_list(
+            'change_seq', flat=True
+        ))
+        self.assertEqual(seqs, sorted(set(seqs)))
+        self.assertGreater(seqs[0], int(token))
+        changes = self.client.get(
+            reverse('books-changes'), {"since": token, "limit": 2}
+        ).json()
+        self.assertTrue(changes['has_more'])
+        changes = self.client.get(
+            reverse('books-changes'), {"since": changes['next_token']}
+        ).json()
+        self.assertEqual(
+            [book['title'] for book in changes['changed']], ["Book 4"]
+        )
+
+    @override_settings(BULK_UPDATE_MAX_ITEMS=3)
+    def test_too_many_items(self):
+        response = self.post([
+            {"id": book.pk, "available": False} for book in self.books
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()['errors'], {"error": "Expected at most 3 items."}
+        )
+        self.assertFalse(Book.objects.filter(available=False).exists())
+
+    @override_settings(CATALOG_SNAPSHOT_ENABLED=True)
+    def test_refreshes_catalog_snapshot(self):
+        clear_catalog_snapshot()
+        self.addCleanup(clear_catalog_snapshot)
+        self.assertEqual(
+            self.client.get(reverse('list-books')).json()['total_items'], 5
+        )
+        self.post([{"id": book.pk, "available": False}
+                   for book in self.books[:3]])
+        self.assertEqual(
+            self.client.get(reverse('list-books')).json()['total_items'], 2
+        )
+
+    def test_invalid_items(self):
+        response = self.post([
+            {"id": self.books[0].pk, "available": False},
+            {"id": "1", "available": False},
+            {"id": 1, "title": "Book 1", "available": False},
+            {"title": "Book 2", "available": "no"},
+        ])
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertIsNone(errors[0])
+        self.assertIn("id", errors[1])
+        self.assertIn("id", errors[2])
+        self.assertIn("available", errors[3])
+        self.assertTrue(Book.objects.get(pk=self.books[0].pk).available)
+
+    def test_invalid_json(self):
+        response = self.client.post(
+            reverse('books-availability'),
+            "not json",
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], "Invalid JSON body")
+
+    def test_requires_post(self):
+        response = self.client.get(reverse('books-availability'))
+        self.assertEqual(response.status_code, 405)
+
+    def test_serializer_save_without_validation(self):
+        serializer = BookAvailabilitySerializer(data=[])
+        with self.assertRaises(ValidationError):
+            serializer.save()
+
+
+class BookQueryPlanTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Book.objects.create(
+            title="Book One",
+            author="Author A",
+            publication_date=date(2005, 1, 1),
+            available=True,
+        )
+
+    def assertViewUsesIndex(self, url, index_name):
+        """
+        EXPLAIN every query the view runs against main_book, so the test
+        follows whatever filter and ordering the view actually uses. Both
+        must be served by the index: a seek and no separate sort.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        book_queries = [
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "main_book"' in query['sql']
+        ]
+        self.assertTrue(book_queries)
+        for sql in book_queries:
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = '\n'.join(row[-1] for row in cursor.fetchall())
+            self.assertIn(index_name, plan, sql)
+            self.assertNotRegex(plan, r'SCAN (TABLE )?main_book\b', sql)
+            self.assertNotIn('USE TEMP B-TREE', plan, sql)
+
+    def test_year_lookup_uses_index(self):
+        self.assertViewUsesIndex(
+            reverse('books-by-year', args=[2005]),
+            'book_available_pub_date_idx'
+        )
+
+    def test_year_range_lookup_uses_index(self):
+        self.assertViewUsesIndex(
+            reverse('books-by-year-range', args=[2000, 2010]),
+            'book_available_pub_date_idx'
+        )
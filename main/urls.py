@@ -3,10 +3,14 @@ from django.urls import path
 
 from .views import (
     get_book,
+    get_book_rating_distribution,
     get_books_list,
     get_books_by_author,
+    get_books_changes,
     get_books_by_publication_year,
-    get_books_list_as_rating_group
+    get_books_by_publication_year_range,
+    get_books_list_as_rating_group,
+    update_books_availability
 )
 
 
@@ -16,6 +20,13 @@ urlpatterns = [
          name='books-by-author'),
     path('books/year/<int:year>/', get_books_by_publication_year, 
          name='books-by-year'),
+    path('books/years/<int:year_from>/<int:year_to>/',
+         get_books_by_publication_year_range, name='books-by-year-range'),
+    path('books/changes/', get_books_changes, name='books-changes'),
+    path('books/availability/', update_books_availability,
+         name='books-availability'),
     path('books/<str:title>/', get_book, name='get-book'),
+    path('books/<str:title>/ratings/', get_book_rating_distribution,
+         name='book-rating-distribution'),
     path('books-by-rating/', get_books_list_as_rating_group,)
 ]
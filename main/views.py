@@ -1,17 +1,39 @@
+import json
+from datetime import MAXYEAR, MINYEAR
+
 from django.conf import settings
 from django.http import JsonResponse
 from django.core.paginator import Paginator
-
-from .models import Book
-from .serializers import BookSerializer
-
-
-def get_books_list(request):
-    if request.method != 'GET':
-        return JsonResponse({'error': 'GET request required'}, status=405)
-
+from django.db.models import QuerySet
+
+from .models import Book, BookTombstone
+from .serializers import BookAvailabilitySerializer, BookSerializer
+from .snapshot import get_catalog_snapshot, select_fields
+
+
+def parse_fields(params):
+    """
+    Parse the optional comma separated ``fields`` query parameter.
+    :return: A list of field names, or None when all fields are wanted.
+    :raises ValueError: If an unknown field is requested.
+    """
+    if not params.get('fields'):
+        return None
+    fields = [f.strip() for f in params['fields'].split(',') if f.strip()]
+    allowed = BookSerializer.FIELDS + BookSerializer.OPTIONAL_FIELDS
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError(f"Invalid fields parameter: {', '.join(unknown)}")
+    return fields
+
+
+def paginated_books_response(request, books):
+    """
+    Paginate and serialize a Book queryset, honouring the ``page``,
+    ``page_size`` and ``fields`` query parameters. ``books`` may also be
+    a list of pre-serialized rows from the catalog snapshot.
+    """
     params = request.GET
-    books = Book.objects.filter(available=True).order_by('-rating')
     page = params.get('page', 1)
     page_size = params.get('page_size', settings.DEFAULT_PAGE_SIZE)
 
@@ -22,6 +44,15 @@ def get_books_list(request):
             "error": "Invalid page_size parameter"
         }, status=400)
 
+    try:
+        fields = parse_fields(params)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    from_snapshot = not isinstance(books, QuerySet)
+    if fields and not from_snapshot:
+        books = books.only(*BookSerializer.source_fields(fields))
+
     paginator = Paginator(books, page_size)
 
     try:
@@ -29,96 +60,214 @@ def get_books_list(request):
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=400)
 
-    serializer = BookSerializer(instance=paginated_books, many=True)
+    if from_snapshot:
+        items = select_fields(paginated_books.object_list, fields)
+    else:
+        items = BookSerializer(
+            instance=paginated_books, many=True, fields=fields
+        ).to_representation()
     data = {
         "total_items": paginator.count,
         "total_pages": paginator.num_pages,
         "current_page": paginated_books.number,
         "page_size": len(paginated_books.object_list),
-        "data": serializer.to_representation(),
+        "data": items,
     }
 
     return JsonResponse(data, safe=False)
 
 
+def get_books_list(request):
+    if request.method != 'GET':
+        return JsonResponse({'error': 'GET request required'}, status=405)
+
+    snapshot = get_catalog_snapshot()
+    if snapshot is not None:
+        return paginated_books_response(request, snapshot.by_rating)
+
+    books = Book.objects.filter(available=True).order_by('-rating', 'pk')
+    return paginated_books_response(request, books)
+
+
 def get_books_by_author(request, author):
     if request.method != 'GET':
         return JsonResponse({'error': 'GET request required'}, status=405)
 
-    params = request.GET
+    snapshot = get_catalog_snapshot()
+    if snapshot is not None:
+        return paginated_books_response(request, snapshot.by_author(author))
 
-    books = Book.objects.filter(author__iexact=author, available=True)
-    page = params.get('page', 1)
-    page_size = params.get('page_size', settings.DEFAULT_PAGE_SIZE)
+    books = Book.objects.filter(
+        author__iexact=author, available=True
+    ).order_by('pk')
+    return paginated_books_response(request, books)
 
-    try:
-        page_size = int(page_size)
-    except ValueError:
+
+def get_books_by_publication_year(request, year):
+    if request.method != 'GET':
+        return JsonResponse({'error': 'GET request required'}, status=405)
+
+    if not MINYEAR <= year <= MAXYEAR:
         return JsonResponse({
-            "error": "Invalid page_size parameter"
+            "error": f"Year must be between {MINYEAR} and {MAXYEAR}"
         }, status=400)
 
-    paginator = Paginator(books, page_size)
+    snapshot = get_catalog_snapshot()
+    if snapshot is not None:
+        return paginated_books_response(request, snapshot.by_years(year, year))
 
-    try:
-        paginated_books = paginator.page(page)
-    except Exception as e:
-        return JsonResponse({"error": str(e)}, status=400)
+    books = Book.objects.filter(
+        publication_date__year=year, available=True
+    ).order_by('publication_date', 'pk')
+    return paginated_books_response(request, books)
 
-    serializer = BookSerializer(instance=paginated_books, many=True)
-    data = {
-        "total_items": paginator.count,
-        "total_pages": paginator.num_pages,
-        "current_page": paginated_books.number,
-        "page_size": len(paginated_books.object_list),
-        "data": serializer.to_representation(),
-    }
 
-    return JsonResponse(data, safe=False)
+def get_books_by_publication_year_range(request, year_from, year_to):
+    if request.method != 'GET':
+        return JsonResponse({'error': 'GET request required'}, status=405)
 
+    if not all(MINYEAR <= year <= MAXYEAR for year in (year_from, year_to)):
+        return JsonResponse({
+            "error": f"Year must be between {MINYEAR} and {MAXYEAR}"
+        }, status=400)
 
-def get_books_by_publication_year(request, year):
+    if year_from > year_to:
+        return JsonResponse({
+            "error": "year_from must not be greater than year_to"
+        }, status=400)
+
+    snapshot = get_catalog_snapshot()
+    if snapshot is not None:
+        return paginated_books_response(
+            request, snapshot.by_years(year_from, year_to)
+        )
+
+    books = Book.objects.filter(
+        publication_date__year__gte=year_from,
+        publication_date__year__lte=year_to,
+        available=True,
+    ).order_by('publication_date', 'pk')
+    return paginated_books_response(request, books)
+
+
+def get_books_changes(request):
+    """
+    Delta sync feed. Returns books changed and ids of books deleted after
+    the ``since`` token, oldest first, in batches of at most ``limit``.
+    Clients pass ``next_token`` back as ``since`` until ``has_more`` is
+    false.
+    """
     if request.method != 'GET':
         return JsonResponse({'error': 'GET request required'}, status=405)
 
     params = request.GET
 
-    books = Book.objects.filter(publication_date__year=year, available=True)
-    page = params.get('page', 1)
-    page_size = params.get('page_size', settings.DEFAULT_PAGE_SIZE)
-
     try:
-        page_size = int(page_size)
+        since = int(params.get('since', 0))
+        if since < 0:
+            raise ValueError
     except ValueError:
         return JsonResponse({
-            "error": "Invalid page_size parameter"
+            "error": "Invalid since parameter"
         }, status=400)
 
-    paginator = Paginator(books, page_size)
-
     try:
-        paginated_books = paginator.page(page)
-    except Exception as e:
-        return JsonResponse({"error": str(e)}, status=400)
+        limit = int(params.get('limit', settings.CHANGES_BATCH_SIZE))
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({
+            "error": "Invalid limit parameter"
+        }, status=400)
+    limit = min(limit, settings.CHANGES_BATCH_SIZE)
+
+    # Books and tombstones share one sequence, so merging the first
+    # ``limit + 1`` of each gives the next batch and tells us whether
+    # anything is left after it.
+    books = Book.objects.filter(change_seq__gt=since).order_by('change_seq')
+    tombstones = BookTombstone.objects.filter(
+        change_seq__gt=since
+    ).order_by('change_seq')
+    changes = sorted(
+        [*books[:limit + 1], *tombstones[:limit + 1]],
+        key=lambda change: change.change_seq,
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    changed, deleted = [], []
+    for change in changes:
+        if isinstance(change, BookTombstone):
+            deleted.append(change.book_id)
+        else:
+            changed.append({
+                "id": change.pk,
+                **BookSerializer(instance=change).to_representation(),
+            })
 
-    serializer = BookSerializer(instance=paginated_books, many=True)
     data = {
-        "total_items": paginator.count,
-        "total_pages": paginator.num_pages,
-        "current_page": paginated_books.number,
-        "page_size": len(paginated_books.object_list),
-        "data": serializer.to_representation(),
+        "changed": changed,
+        "deleted": deleted,
+        "next_token": str(changes[-1].change_seq if changes else since),
+        "has_more": has_more,
     }
 
     return JsonResponse(data, safe=False)
 
 
+def update_books_availability(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST request required'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+
+    serializer = BookAvailabilitySerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse({"errors": serializer.errors}, status=400)
+
+    return JsonResponse(serializer.save())
+
+
 def get_book(request, title):
     try:
-        book = Book.objects.get(title__icontains=title)
+        fields = parse_fields(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    books = Book.objects.all()
+    if fields:
+        books = books.only(*BookSerializer.source_fields(fields))
+
+    try:
+        book = books.get(title__icontains=title)
+    except Book.DoesNotExist:
+        return JsonResponse({'error': 'Book not found'}, status=404)
+    data = BookSerializer(instance=book, fields=fields).to_representation()
+    return JsonResponse(data, safe=False)
+
+
+def get_book_rating_distribution(request, title):
+    if request.method != 'GET':
+        return JsonResponse({'error': 'GET request required'}, status=405)
+
+    books = Book.objects.only(
+        'title', 'rating', *Book.RATING_COUNT_FIELDS.values()
+    )
+    try:
+        book = books.get(title__icontains=title)
     except Book.DoesNotExist:
         return JsonResponse({'error': 'Book not found'}, status=404)
-    data = BookSerializer(instance=book).to_representation()
+
+    distribution = book.rating_distribution
+    data = {
+        "title": book.title,
+        "rating": book.rating,
+        "total_ratings": sum(distribution.values()),
+        "rating_distribution": distribution,
+    }
     return JsonResponse(data, safe=False)
 
 
@@ -15,6 +15,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'django.middleware.gzip.GZipMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -45,3 +46,13 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 DEFAULT_PAGE_SIZE = 10
+
+CHANGES_BATCH_SIZE = 500
+
+BULK_UPDATE_CHUNK_SIZE = 500
+
+BULK_UPDATE_MAX_ITEMS = 100000
+
+# Serve the list, author and year endpoints from an in-memory snapshot of
+# the available books, refreshed whenever the catalog version changes.
+CATALOG_SNAPSHOT_ENABLED = False